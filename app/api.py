@@ -1,10 +1,10 @@
+import logging
 from enum import Enum
 from typing import List
 
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.security.http import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from pyparsing import empty
 
 from app.room_model import (
     JoinRoomResult,
@@ -15,11 +15,32 @@ from app.room_model import (
     WaitRoomStatus,
 )
 
-from . import model, room_model
+from . import db, model, room_model
 from .model import SafeUser
+from .room_event import room_event_bus
+from .score_batch import score_batcher
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+def startup():
+    # engine の作成と最初の接続は import 時ではなく worker 起動時に行う
+    try:
+        db.warm_up()
+    except Exception:
+        # DB に繋がらなくても worker は起動し, DB を使う API だけが失敗する
+        logger.exception("failed to warm up the database connection pool")
+
+
+@app.on_event("shutdown")
+def shutdown():
+    # 終了する worker の socket を残さない
+    room_event_bus.close()
+
+
 # Sample APIs
 
 
@@ -159,10 +180,31 @@ class RoomEndRequest(BaseModel):
 def room_end(req: RoomEndRequest, token: str = Depends(get_auth_token)):
     if len(req.judge_count_list) != 5:
         raise HTTPException(status_code=400, detail="invalid judge_count")
-    room_model.finish_room(req.room_id, req.score, req.judge_count_list, token)
+    try:
+        room_model.finish_room(req.room_id, req.score, req.judge_count_list, token)
+    except model.InvalidToken:
+        raise HTTPException(status_code=404)
     return {}
 
 
+class ScoreBatchMetricsResponse(BaseModel):
+    flush_count: int
+    submission_count: int
+    last_flush_size: int
+    max_flush_size: int
+    avg_flush_size: float
+    last_flush_latency: float
+    max_flush_latency: float
+    avg_flush_latency: float
+    queue_depth: int
+
+
+@app.get("/metrics/score_batch", response_model=ScoreBatchMetricsResponse)
+def score_batch_metrics():
+    """Flush size, flush latency (seconds) and queue depth of the /room/end batcher"""
+    return ScoreBatchMetricsResponse(**score_batcher.get_metrics())
+
+
 class RoomResultRequest(BaseModel):
     room_id: int
 
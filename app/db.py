@@ -1,5 +1,26 @@
-from sqlalchemy import create_engine
+import threading
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 
 from . import config
 
-engine = create_engine(config.DATABASE_URI, future=True, echo=True)
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """import 時ではなく最初に使われたときに engine を作る"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(config.DATABASE_URI, future=True, echo=True)
+    return _engine
+
+
+def warm_up() -> None:
+    """Open a pooled connection so the first request does not pay for it"""
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
@@ -8,7 +8,7 @@ from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.exc import NoResultFound
 
-from .db import engine
+from .db import get_engine
 
 
 class InvalidToken(Exception):
@@ -30,7 +30,7 @@ def create_user(name: str, leader_card_id: int) -> str:
     """Create new user and returns their token"""
     token = str(uuid.uuid4())
     # NOTE: tokenが衝突したらリトライする必要がある.
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         result = conn.execute(
             text(
                 "INSERT INTO `user` (name, token, leader_card_id) VALUES (:name, :token, :leader_card_id)"
@@ -56,13 +56,13 @@ def _get_user_by_token(conn, token: str) -> Optional[SafeUser]:
 
 
 def get_user_by_token(token: str) -> Optional[SafeUser]:
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         return _get_user_by_token(conn, token)
 
 
 def update_user(token: str, name: str, leader_card_id: int) -> None:
     # このコードを実装してもらう
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         # TODO: 実装
         if _get_user_by_token(conn, token) is None:  # 指定のトークンを持つユーザがいない場合
             raise InvalidToken
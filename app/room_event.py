@@ -0,0 +1,338 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+SOCKET_SUFFIX = ".sock"
+MAX_DATAGRAM_SIZE = 4096
+PEER_REFRESH_INTERVAL = 1.0  # 他の worker の socket 一覧を読み直す間隔 (秒)
+PEER_QUEUE_SIZE = 10000  # worker ごとに送信待ちにできる event 数
+SEND_TIMEOUT = 1.0  # 受信側が詰まったまま 1 件の送信を待つ最大時間 (秒)
+
+
+class RoomEventType(str, Enum):
+    Join = "join"
+    Leave = "leave"
+    Start = "start"
+    End = "end"
+    HostChange = "host_change"
+
+
+class RoomEvent:
+    """A change to a room, published after the change is committed.
+
+    `publisher` and `seq` are filled in by `RoomEventBus.publish` so that
+    receivers can detect lost events; they are not part of equality.
+    """
+
+    def __init__(
+        self,
+        type: RoomEventType,
+        room_id: int,
+        user_id: Optional[int] = None,
+        publisher: Optional[str] = None,
+        seq: Optional[int] = None,
+    ) -> None:
+        self.type = RoomEventType(type)
+        self.room_id = room_id
+        self.user_id = user_id
+        self.publisher = publisher
+        self.seq = seq
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RoomEvent):
+            return NotImplemented
+        return (self.type, self.room_id, self.user_id) == (
+            other.type,
+            other.room_id,
+            other.user_id,
+        )
+
+    def __repr__(self) -> str:
+        return f"RoomEvent(type={self.type.value!r}, room_id={self.room_id}, user_id={self.user_id})"
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(
+            dict(
+                type=self.type.value,
+                room_id=self.room_id,
+                user_id=self.user_id,
+                publisher=self.publisher,
+                seq=self.seq,
+            )
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RoomEvent":
+        d = json.loads(data)
+        return cls(
+            RoomEventType(d["type"]),
+            d["room_id"],
+            d.get("user_id"),
+            d.get("publisher"),
+            d.get("seq"),
+        )
+
+
+RoomEventHandler = Callable[[RoomEvent], None]
+# (publisher, 失われた event 数) を受け取る
+RoomEventGapHandler = Callable[[str, int], None]
+
+
+class _Peer:
+    """Another worker's socket, with a bounded queue drained by a sender thread"""
+
+    def __init__(self, bus: "RoomEventBus", path: str) -> None:
+        self.path = path
+        self.stopped = False
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(PEER_QUEUE_SIZE)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.settimeout(SEND_TIMEOUT)
+        self._thread = threading.Thread(
+            target=self._run, args=(bus,), name="room-event-sender", daemon=True
+        )
+        self._thread.start()
+
+    def offer(self, data: bytes) -> bool:
+        """Queue an event without blocking; False if the queue is full"""
+        try:
+            self._queue.put_nowait(data)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self) -> None:
+        self.stopped = True
+        try:
+            self._queue.put_nowait(None)  # get で待っている sender を起こす
+        except queue.Full:
+            pass
+
+    def _run(self, bus: "RoomEventBus") -> None:
+        try:
+            while not self.stopped:
+                data = self._queue.get()
+                if data is None or self.stopped:
+                    return
+                try:
+                    # 受信側の queue (net.unix.max_dgram_qlen) が空くまで待つ
+                    self._sock.sendto(data, self.path)
+                except socket.timeout:
+                    bus._record_drop(self.path)
+                except ConnectionRefusedError:
+                    # 終了した worker の socket が残っている
+                    _unlink(self.path)
+                    bus._peer_gone(self)
+                    return
+                except FileNotFoundError:
+                    bus._peer_gone(self)
+                    return
+                except OSError:
+                    logger.exception("failed to send room event to %s", self.path)
+                    bus._record_drop(self.path)
+        finally:
+            self._sock.close()
+
+
+class RoomEventBus:
+    """Fan out room events to subscribers in every worker on this machine.
+
+    Each worker binds a Unix datagram socket inside `socket_dir` and
+    `publish` sends the event to every other socket found there. Events are
+    delivered to local subscribers synchronously, and to subscribers in
+    other workers from a listener thread. Without `socket_dir` the bus only
+    reaches subscribers in the current process.
+
+    `publish` never blocks the calling thread: each peer has a queue of up
+    to `PEER_QUEUE_SIZE` events drained by its own sender thread, which
+    waits for room in the peer's socket buffer. An event is dropped only
+    when that queue is full or a send waits longer than `SEND_TIMEOUT`;
+    drops are logged and counted in `dropped_count`.
+
+    Every published event carries the bus id and a sequence number. When a
+    receiver sees a sequence gap it counts it in `gap_count` and calls the
+    handlers registered with `subscribe_gap`; anything derived from room
+    events (caches, pollers) must then re-query MySQL.
+
+    The list of peer sockets is cached and re-read every
+    `PEER_REFRESH_INTERVAL` seconds or when a peer has gone away, so a newly
+    started worker may miss events published within that interval.
+    """
+
+    def __init__(self, socket_dir: Optional[str] = None) -> None:
+        self.socket_dir = socket_dir
+        self.id = uuid.uuid4().hex
+        self.dropped_count = 0
+        self.gap_count = 0
+        self._handlers: List[RoomEventHandler] = []
+        self._gap_handlers: List[RoomEventGapHandler] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._last_seq: Dict[str, int] = {}
+        self._sock: Optional[socket.socket] = None
+        self._path: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._peers: Dict[str, _Peer] = {}
+        self._peers_refreshed_at: Optional[float] = None
+
+    def subscribe(self, handler: RoomEventHandler) -> RoomEventHandler:
+        with self._lock:
+            self._handlers.append(handler)
+        self._ensure_started()
+        return handler
+
+    def unsubscribe(self, handler: RoomEventHandler) -> None:
+        with self._lock:
+            self._handlers.remove(handler)
+
+    def subscribe_gap(self, handler: RoomEventGapHandler) -> RoomEventGapHandler:
+        with self._lock:
+            self._gap_handlers.append(handler)
+        self._ensure_started()
+        return handler
+
+    def publish(self, event: RoomEvent) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._seq += 1
+            event.publisher = self.id
+            event.seq = self._seq
+        self._dispatch(event)
+        if self.socket_dir is None:
+            return
+        data = event.to_bytes()
+        for peer in self._get_peers():
+            if not peer.offer(data):
+                self._record_drop(peer.path)
+
+    def _get_peers(self) -> List[_Peer]:
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._peers_refreshed_at is None
+                or now - self._peers_refreshed_at >= PEER_REFRESH_INTERVAL
+            ):
+                paths = {
+                    os.path.join(self.socket_dir, name)
+                    for name in os.listdir(self.socket_dir)
+                    if name.endswith(SOCKET_SUFFIX)
+                }
+                paths.discard(self._path)
+                for path in list(self._peers):
+                    if path not in paths:
+                        self._peers.pop(path).stop()
+                for path in paths:
+                    if path not in self._peers:
+                        self._peers[path] = _Peer(self, path)
+                self._peers_refreshed_at = now
+            return list(self._peers.values())
+
+    def _peer_gone(self, peer: _Peer) -> None:
+        with self._lock:
+            if self._peers.get(peer.path) is peer:
+                del self._peers[peer.path]
+            self._peers_refreshed_at = None
+
+    def _record_drop(self, path: str) -> None:
+        with self._lock:
+            self.dropped_count += 1
+        logger.warning("dropped room event for %s", path)
+
+    def close(self) -> None:
+        with self._lock:
+            sock, self._sock = self._sock, None
+            path, self._path = self._path, None
+            peers, self._peers = self._peers, {}
+            self._peers_refreshed_at = None
+        for peer in peers.values():
+            peer.stop()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # recv で待っている listener を起こす
+            except OSError:
+                pass
+            sock.close()
+        if path is not None:
+            _unlink(path)
+
+    def _ensure_started(self) -> None:
+        if self.socket_dir is None:
+            return
+        with self._lock:
+            if self._sock is not None:
+                return
+            os.makedirs(self.socket_dir, exist_ok=True)
+            path = os.path.join(
+                self.socket_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}{SOCKET_SUFFIX}"
+            )
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            self._sock = sock
+            self._path = path
+            self._thread = threading.Thread(
+                target=self._listen, args=(sock,), name="room-event-bus", daemon=True
+            )
+            self._thread.start()
+
+    def _listen(self, sock: socket.socket) -> None:
+        while True:
+            try:
+                data = sock.recv(MAX_DATAGRAM_SIZE)
+            except OSError:
+                return  # close() された
+            if self._sock is not sock:
+                return
+            try:
+                event = RoomEvent.from_bytes(data)
+            except (ValueError, KeyError):
+                continue
+            self._check_seq(event)
+            self._dispatch(event)
+
+    def _check_seq(self, event: RoomEvent) -> None:
+        # _last_seq は listener スレッドからしか触らない
+        if event.publisher is None or event.seq is None:
+            return
+        last = self._last_seq.get(event.publisher)
+        self._last_seq[event.publisher] = event.seq
+        if last is None or event.seq <= last + 1:
+            return
+        missed = event.seq - last - 1
+        with self._lock:
+            self.gap_count += missed
+            gap_handlers = list(self._gap_handlers)
+        logger.warning("missed %d room events from %s", missed, event.publisher)
+        for handler in gap_handlers:
+            try:
+                handler(event.publisher, missed)
+            except Exception:
+                logger.exception("room event gap handler failed")
+
+    def _dispatch(self, event: RoomEvent) -> None:
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("room event handler failed: %r", event)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+room_event_bus = RoomEventBus(config.ROOM_EVENT_SOCKET_DIR)
@@ -1,7 +1,5 @@
-from curses.ascii import HT
 import json
 import uuid
-from curses import REPORT_MOUSE_POSITION
 from enum import Enum, IntEnum
 from typing import List, Optional, Tuple
 
@@ -10,9 +8,11 @@ from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.exc import NoResultFound
 
-from . import model
-from .db import engine
+from . import config, model
+from .db import get_engine
 from .model import SafeUser, get_user_by_token
+from .room_event import RoomEvent, RoomEventType, room_event_bus
+from .score_batch import score_batcher
 
 MAX_USER_COUNT = 4  # 部屋に入れる最大人数
 
@@ -60,7 +60,7 @@ class ResultUser(BaseModel):
 def create_room(live_id: int, select_difficulty: LiveDifficulty, token: str) -> int:
     """Create new room and returns room_id"""
     user_id = model.get_user_by_token(token).id
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         result = conn.execute(
             text(
                 "INSERT INTO `room` (live_id, joined_user_count, status, host) VALUES (:live_id, 1, 1, :user_id)"
@@ -84,7 +84,7 @@ def create_room(live_id: int, select_difficulty: LiveDifficulty, token: str) ->
 def get_room_list(live_id: int) -> List[RoomInfo]:  # roomが存在しないときは空リストを返す。
     """Search available rooms"""
     available_rooms = []
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         if live_id == 0:
             result = conn.execute(
                 text("SELECT `room_id`, `live_id`, `joined_user_count`, `status` FROM `room`"),
@@ -111,7 +111,7 @@ def get_room_list(live_id: int) -> List[RoomInfo]:  # roomが存在しないと
 
 def join_room(room_id: int, select_difficulty: int, token: str) -> JoinRoomResult:
     """join the room specified by room_id"""
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         result = conn.execute(
             text(
                 "SELECT `room_id`, `live_id`, `joined_user_count`, `host` FROM `room` WHERE `room_id`=:room_id"
@@ -137,13 +137,16 @@ def join_room(room_id: int, select_difficulty: int, token: str) -> JoinRoomResul
                         select_difficulty=select_difficulty
                     ),
                 )
-                return JoinRoomResult.Ok
+                join_room_result = JoinRoomResult.Ok
             else:
                 return JoinRoomResult.RoomFull
         except NoResultFound:
             return JoinRoomResult.Disbanded
         # except:
         # return JoinRoomResult.OtherError
+    # commit 後に通知する
+    room_event_bus.publish(RoomEvent(RoomEventType.Join, room_id, user_id))
+    return join_room_result
 
 
 def get_room_status(conn, room_id: int) -> WaitRoomStatus:
@@ -200,31 +203,40 @@ def get_room_users(conn, room_id: int, token: str) -> List[RoomUser]:
 
 
 def wait_room(room_id: int, token: str) -> Tuple[WaitRoomStatus, List[RoomUser]]:
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         room_status = get_room_status(conn, room_id)
         room_users = get_room_users(conn, room_id, token)
     return (room_status, room_users)
 
 
 def start_room(room_id: int, token: str) -> None:
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         conn.execute(
             text("UPDATE `room` SET `status`=2 WHERE `room_id`=:room_id"),
             dict(room_id=room_id),
         )
+    room_event_bus.publish(RoomEvent(RoomEventType.Start, room_id))
     return None
 
 
 def finish_room(
     room_id: int, score: int, judge_count_list: List[int], token: str
 ) -> None:
+    if config.SCORE_BATCH_ENABLED:
+        # 他のプレイヤーの送信とまとめて書き込まれ, 書き込み完了まで待つ
+        user_id = score_batcher.submit(room_id, score, judge_count_list, token)
+        room_event_bus.publish(RoomEvent(RoomEventType.End, room_id, user_id))
+        return None
     perfect_count = judge_count_list[0]
     great_count = judge_count_list[1]
     good_count = judge_count_list[2]
     bad_count = judge_count_list[3]
     miss_count = judge_count_list[4]
-    user_id = get_user_by_token(token).id
-    with engine.begin() as conn:
+    user = get_user_by_token(token)
+    if user is None:
+        raise model.InvalidToken
+    user_id = user.id
+    with get_engine().begin() as conn:
         conn.execute(
             text(
                 "UPDATE `room_members` SET `status`=2, `score`=:score, `perfect`=:perfect, `great`=:great, `good`=:good, `bad`=:bad, `miss`=:miss WHERE `room_id`=:room_id AND`user_id`=:user_id"
@@ -240,12 +252,13 @@ def finish_room(
                 user_id=user_id,
             ),
         )
+    room_event_bus.publish(RoomEvent(RoomEventType.End, room_id, user_id))
     return None
 
 
 def show_result(room_id: int) -> List[ResultUser]:
     user_result_list = []
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         result = conn.execute(
             text(
                 "SELECT `user_id`, `status`, `score`, `perfect`, `great`, `good`, `bad`, `miss` FROM `room_members` WHERE `room_id`=:room_id"
@@ -295,7 +308,7 @@ def delete_user_from_db(conn, room_id, user_id) -> None:
     return
 
 
-def change_host(conn, room_id) -> None:
+def change_host(conn, room_id) -> int:
     result = conn.execute(
         text("SELECT `user_id` FROM `room_members` WHERE `room_id`=:room_id"),
         dict(room_id=room_id),
@@ -305,11 +318,12 @@ def change_host(conn, room_id) -> None:
         text("UPDATE `room` SET `host`=:new_host WHERE `room_id`=:room_id"),
         dict(new_host=row.user_id, room_id=room_id),
     )
-    return
+    return row.user_id
 
 
 def leave_room(room_id: int, token: str) -> None:
-    with engine.begin() as conn:
+    new_host = None
+    with get_engine().begin() as conn:
         result = conn.execute(
             text(
                 "SELECT `joined_user_count`, `host` FROM `room` WHERE `room_id`=:room_id"
@@ -326,7 +340,7 @@ def leave_room(room_id: int, token: str) -> None:
                 delete_room_from_db(conn, room_id)  # room table から roomの情報を削除
             else:
                 if row.host == user_id:
-                    change_host(conn, room_id)  # room の host を変更
+                    new_host = change_host(conn, room_id)  # room の host を変更
                 conn.execute(
                     text(
                         "UPDATE `room` SET `joined_user_count`=:decrement_user_count WHERE `room_id`=:room_id"
@@ -336,6 +350,9 @@ def leave_room(room_id: int, token: str) -> None:
                         room_id=room_id,
                     ),
                 )
-            return
         except NoResultFound:
             return  # TODO : エラーハンドリング
+    room_event_bus.publish(RoomEvent(RoomEventType.Leave, room_id, user_id))
+    if new_host is not None:
+        room_event_bus.publish(RoomEvent(RoomEventType.HostChange, room_id, new_host))
+    return
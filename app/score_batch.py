@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from . import config
+from .db import get_engine
+from .model import InvalidToken
+
+
+class _Submission:
+    """flush を待っている 1 件分のスコア送信"""
+
+    def __init__(
+        self, room_id: int, score: int, judge_count_list: List[int], token: str
+    ) -> None:
+        self.room_id = room_id
+        self.score = score
+        self.judge_count_list = judge_count_list
+        self.token = token
+        self.done = threading.Event()
+        self.user_id: Optional[int] = None
+        self.error: Optional[Exception] = None  # この送信だけのエラー
+        self.flush_error: Optional[Exception] = None  # batch 全体で共有されるエラー
+
+
+class ScoreBatchMetrics:
+    """Counters describing the flushes done by a ScoreBatcher"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.flush_count = 0
+        self.submission_count = 0
+        self.last_flush_size = 0
+        self.max_flush_size = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def record(self, size: int, latency: float) -> None:
+        with self._lock:
+            self.flush_count += 1
+            self.submission_count += size
+            self.last_flush_size = size
+            self.max_flush_size = max(self.max_flush_size, size)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+
+    def snapshot(self, queue_depth: int) -> Dict[str, float]:
+        with self._lock:
+            flush_count = self.flush_count
+            return dict(
+                flush_count=flush_count,
+                submission_count=self.submission_count,
+                last_flush_size=self.last_flush_size,
+                max_flush_size=self.max_flush_size,
+                avg_flush_size=(
+                    self.submission_count / flush_count if flush_count else 0.0
+                ),
+                last_flush_latency=self.last_flush_latency,
+                max_flush_latency=self.max_flush_latency,
+                avg_flush_latency=(
+                    self.total_flush_latency / flush_count if flush_count else 0.0
+                ),
+                queue_depth=queue_depth,
+            )
+
+
+class ScoreBatcher:
+    """Queue score submissions and write them to `room_members` in batches.
+
+    Callers block in `submit` until the batch containing their submission
+    has been committed, so a successful return means the score is stored.
+    """
+
+    def __init__(self, interval: float, max_size: int) -> None:
+        self.interval = interval
+        self.max_size = max_size
+        self.metrics = ScoreBatchMetrics()
+        self._queue: "queue.Queue[_Submission]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self, room_id: int, score: int, judge_count_list: List[int], token: str
+    ) -> int:
+        """Queue a submission, wait for its batch and return the user_id"""
+        self._ensure_started()
+        submission = _Submission(room_id, score, judge_count_list, token)
+        self._queue.put(submission)
+        submission.done.wait()
+        if submission.error is not None:
+            raise submission.error
+        if submission.flush_error is not None:
+            # 同じ例外を複数のスレッドから raise しないよう呼び出しごとに包む
+            raise RuntimeError("score batch flush failed") from submission.flush_error
+        return submission.user_id
+
+    def get_metrics(self) -> Dict[str, float]:
+        return self.metrics.snapshot(self._queue.qsize())
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="score-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self) -> List[_Submission]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                _flush(batch)
+            except Exception as e:
+                for submission in batch:
+                    submission.flush_error = e
+            self.metrics.record(len(batch), time.monotonic() - started)
+            for submission in batch:
+                submission.done.set()
+
+
+def _flush(batch: List[_Submission]) -> None:
+    """Write a batch with one token lookup and one multi-row UPDATE"""
+    tokens = {submission.token for submission in batch}
+    with get_engine().begin() as conn:
+        token_params = {f"token_{i}": token for i, token in enumerate(tokens)}
+        result = conn.execute(
+            text(
+                "SELECT `id`, `token` FROM `user` WHERE `token` IN ("
+                + ", ".join(f":{name}" for name in token_params)
+                + ")"
+            ),
+            token_params,
+        )
+        user_ids = {row.token: row.id for row in result.all()}
+
+        # 同じ (room_id, user_id) が複数回送られた場合は最後の送信を書き込む
+        latest: Dict[Tuple[int, int], _Submission] = {}
+        for submission in batch:
+            user_id = user_ids.get(submission.token)
+            if user_id is None:
+                submission.error = InvalidToken()
+                continue
+            submission.user_id = user_id
+            latest[(submission.room_id, user_id)] = submission
+
+        rows = []
+        params = {}
+        for (room_id, user_id), submission in latest.items():
+            i = len(rows)
+            rows.append(
+                f"SELECT :room_id_{i} AS `room_id`, :user_id_{i} AS `user_id`, "
+                f":score_{i} AS `score`, :perfect_{i} AS `perfect`, "
+                f":great_{i} AS `great`, :good_{i} AS `good`, "
+                f":bad_{i} AS `bad`, :miss_{i} AS `miss`"
+            )
+            perfect, great, good, bad, miss = submission.judge_count_list
+            params.update(
+                {
+                    f"room_id_{i}": room_id,
+                    f"user_id_{i}": user_id,
+                    f"score_{i}": submission.score,
+                    f"perfect_{i}": perfect,
+                    f"great_{i}": great,
+                    f"good_{i}": good,
+                    f"bad_{i}": bad,
+                    f"miss_{i}": miss,
+                }
+            )
+        if not rows:
+            return
+        conn.execute(
+            text(
+                "UPDATE `room_members` AS `m` INNER JOIN ("
+                + " UNION ALL ".join(rows)
+                + ") AS `s` ON `m`.`room_id` = `s`.`room_id` AND `m`.`user_id` = `s`.`user_id`"
+                " SET `m`.`status`=2, `m`.`score`=`s`.`score`, `m`.`perfect`=`s`.`perfect`,"
+                " `m`.`great`=`s`.`great`, `m`.`good`=`s`.`good`, `m`.`bad`=`s`.`bad`, `m`.`miss`=`s`.`miss`"
+            ),
+            params,
+        )
+
+
+score_batcher = ScoreBatcher(config.SCORE_BATCH_INTERVAL, config.SCORE_BATCH_MAX_SIZE)
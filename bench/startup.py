@@ -0,0 +1,136 @@
+"""Measure worker start-up cost.
+
+* cold import: time to ``import app.api`` in a fresh interpreter
+* time to first request: time from spawning a single uvicorn worker until
+  ``POST /room/list`` answers, which includes the startup hook (engine
+  creation and pool warm-up) and a query through the pool. A worker whose
+  database is unreachable makes the benchmark fail instead of reporting a
+  time.
+
+Usage: python -m bench.startup [--runs N] [--skip-server]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import app.api
+print(time.perf_counter() - t)
+"""
+
+
+def measure_cold_import() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _first_request(url: str) -> urllib.request.Request:
+    # DB を使う API を叩き, 接続できない worker の時間を計測しないようにする
+    return urllib.request.Request(
+        url,
+        data=json.dumps({"live_id": -1}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+def measure_first_request(timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/room/list"
+    stderr = tempfile.TemporaryFile()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.api:app",
+            "--port",
+            str(port),
+            "--workers",
+            "1",
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=stderr,
+    )
+
+    def uvicorn_stderr() -> str:
+        # uvicorn と共有している file offset を動かさずに読む
+        fd = stderr.fileno()
+        return os.pread(fd, os.fstat(fd).st_size, 0).decode(errors="replace")
+
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(
+                    f"uvicorn exited with {proc.returncode}:\n{uvicorn_stderr()}"
+                )
+            try:
+                with urllib.request.urlopen(_first_request(url), timeout=1) as res:
+                    if res.status == 200:
+                        return time.perf_counter() - started
+            except urllib.error.HTTPError as e:
+                raise RuntimeError(
+                    f"first request failed with {e.code}:\n{uvicorn_stderr()}"
+                )
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.01)
+        raise TimeoutError(
+            f"no response from {url} within {timeout}s:\n{uvicorn_stderr()}"
+        )
+    finally:
+        proc.terminate()
+        proc.wait()
+        stderr.close()
+
+
+def _report(name: str, samples) -> None:
+    ms = [s * 1000 for s in samples]
+    print(
+        f"{name}: median {statistics.median(ms):.1f} ms, "
+        f"min {min(ms):.1f} ms, max {max(ms):.1f} ms ({len(ms)} runs)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    _report("cold import", [measure_cold_import() for _ in range(args.runs)])
+    if not args.skip_server:
+        _report(
+            "time to first request",
+            [measure_first_request() for _ in range(args.runs)],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 
 from app.api import app
+from app.room_event import RoomEvent, RoomEventType, room_event_bus
 
 client = TestClient(app)
 user_tokens = []
@@ -64,3 +65,71 @@ def test_room_1():
     )
     assert response.status_code == 200
     print("room/end response:", response.json())
+
+
+def _user_id(i):
+    response = client.get("/user/me", headers=_auth_header(i))
+    return response.json()["id"]
+
+
+def test_room_events():
+    events = []
+    handler = room_event_bus.subscribe(events.append)
+    try:
+        response = client.post(
+            "/room/create",
+            headers=_auth_header(2),
+            json={"live_id": 1002, "select_difficulty": 1},
+        )
+        room_id = response.json()["room_id"]
+
+        response = client.post(
+            "/room/join",
+            headers=_auth_header(3),
+            json={"room_id": room_id, "select_difficulty": 2},
+        )
+        assert response.status_code == 200
+        response = client.post(
+            "/room/join",
+            headers=_auth_header(4),
+            json={"room_id": room_id, "select_difficulty": 1},
+        )
+        assert response.status_code == 200
+        assert events == [
+            RoomEvent(RoomEventType.Join, room_id, _user_id(3)),
+            RoomEvent(RoomEventType.Join, room_id, _user_id(4)),
+        ]
+
+        # host が抜けると Leave の後に HostChange が届く
+        events.clear()
+        response = client.post(
+            "/room/leave", headers=_auth_header(2), json={"room_id": room_id}
+        )
+        assert response.status_code == 200
+        assert len(events) == 2
+        assert events[0] == RoomEvent(RoomEventType.Leave, room_id, _user_id(2))
+        assert events[1].type == RoomEventType.HostChange
+        assert events[1].room_id == room_id
+        assert events[1].user_id in (_user_id(3), _user_id(4))
+
+        events.clear()
+        response = client.post(
+            "/room/start", headers=_auth_header(3), json={"room_id": room_id}
+        )
+        assert response.status_code == 200
+        assert events == [RoomEvent(RoomEventType.Start, room_id)]
+
+        events.clear()
+        response = client.post(
+            "/room/end",
+            headers=_auth_header(3),
+            json={
+                "room_id": room_id,
+                "score": 1234,
+                "judge_count_list": [4, 3, 2, 1, 0],
+            },
+        )
+        assert response.status_code == 200
+        assert events == [RoomEvent(RoomEventType.End, room_id, _user_id(3))]
+    finally:
+        room_event_bus.unsubscribe(handler)
@@ -0,0 +1,123 @@
+import os
+import queue
+import socket
+import tempfile
+import threading
+
+from app.room_event import RoomEvent, RoomEventBus, RoomEventType
+
+
+def test_room_event_local_only():
+    bus = RoomEventBus()
+    received = []
+    bus.subscribe(received.append)
+
+    event = RoomEvent(RoomEventType.Start, 1)
+    bus.publish(event)
+    assert received == [event]
+
+
+def test_room_event_fan_out():
+    with tempfile.TemporaryDirectory() as socket_dir:
+        # 同じディレクトリを使う bus で複数の worker を模す
+        worker_1 = RoomEventBus(socket_dir)
+        worker_2 = RoomEventBus(socket_dir)
+        worker_3 = RoomEventBus(socket_dir)
+        received_1 = queue.Queue()
+        received_2 = queue.Queue()
+        received_3 = queue.Queue()
+        worker_1.subscribe(received_1.put)
+        worker_2.subscribe(received_2.put)
+        worker_3.subscribe(received_3.put)
+        try:
+            event = RoomEvent(RoomEventType.HostChange, 10, user_id=3)
+            worker_1.publish(event)
+            assert received_1.get(timeout=1) == event
+            assert received_2.get(timeout=1) == event
+            assert received_3.get(timeout=1) == event
+
+            # 終了した worker の socket は消え, 残りの worker には届き続ける
+            worker_2.close()
+            assert len(os.listdir(socket_dir)) == 2
+            event = RoomEvent(RoomEventType.Leave, 10, user_id=3)
+            worker_1.publish(event)
+            assert received_1.get(timeout=1) == event
+            assert received_3.get(timeout=1) == event
+        finally:
+            worker_1.close()
+            worker_2.close()
+            worker_3.close()
+        # 自分の socket には送らないので local の subscriber には 1 回ずつ
+        assert received_1.empty()
+
+
+def test_room_event_publish_does_not_block_on_stalled_subscriber():
+    with tempfile.TemporaryDirectory() as socket_dir:
+        worker_1 = RoomEventBus(socket_dir)
+        worker_2 = RoomEventBus(socket_dir)
+        release = threading.Event()
+        stalled = threading.Event()
+
+        def slow_handler(event):
+            stalled.set()
+            release.wait()
+
+        worker_2.subscribe(slow_handler)
+        try:
+            worker_1.publish(RoomEvent(RoomEventType.Start, 1))
+            assert stalled.wait(timeout=1)
+
+            # worker_2 の受信 queue が溢れても publish は止まらない
+            def publish_many():
+                for _ in range(100):
+                    worker_1.publish(RoomEvent(RoomEventType.End, 1, user_id=1))
+
+            publisher = threading.Thread(target=publish_many, daemon=True)
+            publisher.start()
+            publisher.join(timeout=1)
+            assert not publisher.is_alive()
+        finally:
+            release.set()
+            worker_1.close()
+            worker_2.close()
+
+
+def test_room_event_burst_is_not_dropped():
+    with tempfile.TemporaryDirectory() as socket_dir:
+        worker_1 = RoomEventBus(socket_dir)
+        worker_2 = RoomEventBus(socket_dir)
+        received_2 = queue.Queue()
+        worker_2.subscribe(received_2.put)
+        try:
+            # net.unix.max_dgram_qlen (既定 10) を大きく超える数を一度に送る
+            count = 500
+            for i in range(count):
+                worker_1.publish(RoomEvent(RoomEventType.End, 1, user_id=i))
+            user_ids = [received_2.get(timeout=5).user_id for _ in range(count)]
+            assert user_ids == list(range(count))
+            assert worker_1.dropped_count == 0
+            assert worker_2.gap_count == 0
+        finally:
+            worker_1.close()
+            worker_2.close()
+
+
+def test_room_event_gap_is_detected():
+    with tempfile.TemporaryDirectory() as socket_dir:
+        worker = RoomEventBus(socket_dir)
+        received = queue.Queue()
+        gaps = queue.Queue()
+        worker.subscribe(received.put)
+        worker.subscribe_gap(lambda publisher, missed: gaps.put((publisher, missed)))
+        (path,) = [os.path.join(socket_dir, name) for name in os.listdir(socket_dir)]
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for seq in (1, 2, 5):
+                event = RoomEvent(RoomEventType.Join, 1, 1, publisher="other", seq=seq)
+                sender.sendto(event.to_bytes(), path)
+            assert [received.get(timeout=1).seq for _ in range(3)] == [1, 2, 5]
+            assert gaps.get(timeout=1) == ("other", 2)
+            assert worker.gap_count == 2
+        finally:
+            sender.close()
+            worker.close()
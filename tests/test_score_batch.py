@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.api import app
+from app.score_batch import (
+    ScoreBatcher,
+    ScoreBatchMetrics,
+    _Submission,
+    score_batcher,
+)
+
+client = TestClient(app)
+user_tokens = []
+
+
+def _create_users():
+    for i in range(4):
+        response = client.post(
+            "/user/create",
+            json={"user_name": f"score_batch_user_{i}", "leader_card_id": 1000},
+        )
+        user_tokens.append(response.json()["user_token"])
+
+
+_create_users()
+
+
+def _auth_header(i=0):
+    token = user_tokens[i]
+    return {"Authorization": f"bearer {token}"}
+
+
+def _submission(i=0):
+    return _Submission(1, i, [1, 2, 3, 4, 5], f"token_{i}")
+
+
+@pytest.fixture
+def score_batch_enabled(monkeypatch):
+    monkeypatch.setattr(config, "SCORE_BATCH_ENABLED", True)
+
+
+def test_collect_max_size():
+    batcher = ScoreBatcher(interval=1.0, max_size=3)
+    for i in range(5):
+        batcher._queue.put(_submission(i))
+
+    batch = batcher._collect()
+    assert [submission.score for submission in batch] == [0, 1, 2]
+    assert batcher._queue.qsize() == 2
+
+
+def test_collect_interval():
+    batcher = ScoreBatcher(interval=0.05, max_size=100)
+    batcher._queue.put(_submission())
+
+    started = time.monotonic()
+    batch = batcher._collect()
+    elapsed = time.monotonic() - started
+    assert len(batch) == 1
+    assert 0.04 <= elapsed < 1.0
+
+
+def test_metrics_snapshot():
+    metrics = ScoreBatchMetrics()
+    assert metrics.snapshot(queue_depth=0)["avg_flush_size"] == 0.0
+
+    metrics.record(4, 0.002)
+    metrics.record(2, 0.004)
+    snapshot = metrics.snapshot(queue_depth=3)
+    assert snapshot["flush_count"] == 2
+    assert snapshot["submission_count"] == 6
+    assert snapshot["last_flush_size"] == 2
+    assert snapshot["max_flush_size"] == 4
+    assert snapshot["avg_flush_size"] == 3.0
+    assert snapshot["last_flush_latency"] == 0.004
+    assert snapshot["max_flush_latency"] == 0.004
+    assert snapshot["avg_flush_latency"] == pytest.approx(0.003)
+    assert snapshot["queue_depth"] == 3
+
+
+def test_score_batch_room_end(score_batch_enabled, monkeypatch):
+    # 4 人分の送信が 1 回の flush に収まるよう待ち時間を延ばす
+    monkeypatch.setattr(score_batcher, "interval", 0.2)
+
+    response = client.post(
+        "/room/create",
+        headers=_auth_header(0),
+        json={"live_id": 1001, "select_difficulty": 1},
+    )
+    assert response.status_code == 200
+    room_id = response.json()["room_id"]
+
+    for i in range(1, 4):
+        response = client.post(
+            "/room/join",
+            headers=_auth_header(i),
+            json={"room_id": room_id, "select_difficulty": 1},
+        )
+        assert response.status_code == 200
+
+    response = client.post(
+        "/room/start", headers=_auth_header(0), json={"room_id": room_id}
+    )
+    assert response.status_code == 200
+
+    before = client.get("/metrics/score_batch").json()
+
+    # 全員がほぼ同時に /room/end を呼ぶ
+    status_codes = [None] * 4
+
+    def end(i):
+        response = client.post(
+            "/room/end",
+            headers=_auth_header(i),
+            json={
+                "room_id": room_id,
+                "score": 1000 + i,
+                "judge_count_list": [i, 1, 2, 3, 4],
+            },
+        )
+        status_codes[i] = response.status_code
+
+    threads = [threading.Thread(target=end, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert status_codes == [200] * 4
+
+    response = client.post("/room/result", json={"room_id": room_id})
+    assert response.status_code == 200
+    result_user_list = response.json()["result_user_list"]
+    assert sorted(user["score"] for user in result_user_list) == [
+        1000,
+        1001,
+        1002,
+        1003,
+    ]
+
+    response = client.get("/metrics/score_batch")
+    assert response.status_code == 200
+    after = response.json()
+    assert after["submission_count"] - before["submission_count"] == 4
+    assert 0 < after["flush_count"] - before["flush_count"] < 4
+    assert after["max_flush_size"] > 1
+    assert after["queue_depth"] == 0
+
+
+def test_score_batch_invalid_token(score_batch_enabled):
+    response = client.post(
+        "/room/end",
+        headers={"Authorization": "bearer invalid-token"},
+        json={"room_id": 1, "score": 0, "judge_count_list": [0, 0, 0, 0, 0]},
+    )
+    assert response.status_code == 404
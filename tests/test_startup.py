@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 他のテストが既に app を import しているので新しいインタプリタで確認する
+IMPORT_CHECK = """
+import sys
+import app.api
+from app import db
+assert db._engine is None, "engine created at import time"
+for name in ("curses", "pyparsing"):
+    assert name not in sys.modules, f"{name} imported"
+"""
+
+
+def test_import_has_no_side_effects():
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_CHECK],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr